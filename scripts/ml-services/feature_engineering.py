@@ -6,117 +6,181 @@ Prepares sports data for machine learning predictions
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import glob
 import logging
+from contextlib import contextmanager, nullcontext
 from typing import Dict, List, Tuple, Optional
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database_utils import DatabaseManager
+from ml_models.rolling_stats import NUMBA_AVAILABLE, NUMBA_MIN_ROWS, STAT_COLUMNS, compute_rolling
 
 logger = logging.getLogger(__name__)
 
+# Head-to-head stat columns, in the order get_head_to_head_stats returns them
+H2H_COLUMNS = ['h2h_win_pct', 'avg_total_points', 'avg_margin']
+
+# Game feature columns, in the order _build_feature_matrix produces them
+FEATURE_NAMES = (
+    # Team strength features
+    'home_avg_scored', 'home_avg_allowed', 'away_avg_scored', 'away_avg_allowed',
+    # Differential features
+    'home_point_diff', 'away_point_diff', 'point_diff_advantage',
+    # Win percentage features
+    'home_win_pct', 'away_win_pct', 'win_pct_advantage',
+    # Home court advantage
+    'home_court_advantage',
+    # Recent form
+    'home_recent_form', 'away_recent_form', 'form_advantage',
+    # Head-to-head
+    'h2h_win_pct', 'h2h_avg_total', 'h2h_avg_margin',
+    # Consistency features
+    'home_consistency', 'away_consistency',
+    # Projected totals
+    'projected_home_score', 'projected_away_score', 'projected_total', 'projected_spread'
+)
+
+# Bump when feature definitions change so cached training sets are rebuilt
+FEATURE_CACHE_VERSION = 2
+
+def stats_bucket() -> str:
+    """Current UTC hour; memoized stats and cached predictions expire when it changes"""
+    return datetime.now(timezone.utc).strftime('%Y%m%d%H')
+
 class FeatureEngineer:
     def __init__(self):
         self.db = DatabaseManager()
+        self.cache_dir = "ml_models/feature_cache"
+        
+        # Memoized stats, keyed by (team_id, games_back) and by
+        # (team_a, team_b, games_back) with team_a < team_b, for the hour
+        # in _cache_bucket
+        self._team_stats_cache = {}
+        self._h2h_cache = {}
+        self._cache_bucket = stats_bucket()
     
-    def get_team_stats(self, team_id: str, games_back: int = 10) -> Dict:
-        """Calculate team statistics over recent games"""
+    def invalidate(self):
+        """Drop memoized team and head-to-head stats"""
+        self._team_stats_cache.clear()
+        self._h2h_cache.clear()
+        self._cache_bucket = stats_bucket()
+    
+    def _expire_stale_stats(self):
+        """Drop memoized stats left over from an earlier hour"""
+        if self._cache_bucket != stats_bucket():
+            self.invalidate()
+    
+    @contextmanager
+    def _connection(self, conn=None):
+        """Use the caller's connection if given, otherwise check one out"""
+        if conn is not None:
+            yield conn
+        else:
+            with self.db.get_connection() as new_conn:
+                yield new_conn
+    
+    def _rollback(self, conn=None):
+        """Clear a failed query off a shared connection so later lookups can still run"""
+        if conn is None:
+            return
+        
         try:
-            with self.db.get_connection() as conn:
-                # Get recent games for the team
-                query = """
+            conn.rollback()
+        except Exception as e:
+            logger.error(f"Error rolling back connection: {str(e)}")
+    
+    def get_team_stats(self, team_id: str, games_back: int = 10, conn=None) -> Dict:
+        """Calculate team statistics over recent games"""
+        self._expire_stale_stats()
+        key = (team_id, games_back)
+        if key not in self._team_stats_cache:
+            try:
+                self._team_stats_cache[key] = self._compute_team_stats(team_id, games_back, conn)
+            except Exception as e:
+                logger.error(f"Error calculating team stats: {str(e)}")
+                self._rollback(conn)
+                return self._get_default_stats()
+        
+        return dict(self._team_stats_cache[key])
+    
+    def _compute_team_stats(self, team_id: str, games_back: int, conn=None, recent_games: int = 5) -> Dict:
+        """Aggregate a team's recent games in the database"""
+        with self._connection(conn) as conn:
+            with conn.cursor() as cur:
+                # Reduce the team's last games_back games to a single row
+                cur.execute("""
                     SELECT 
-                        g.id,
-                        g.home_team_id,
-                        g.away_team_id,
-                        g.home_score,
-                        g.away_score,
-                        g.game_date,
-                        CASE 
-                            WHEN g.home_team_id = %s THEN 'home'
-                            ELSE 'away'
-                        END as venue
-                    FROM games g
-                    WHERE (g.home_team_id = %s OR g.away_team_id = %s)
-                        AND g.status = 'completed'
-                        AND g.home_score IS NOT NULL
-                        AND g.away_score IS NOT NULL
-                    ORDER BY g.game_date DESC
-                    LIMIT %s
-                """
-                
-                df = pd.read_sql(query, conn, params=[team_id, team_id, team_id, games_back])
-                
-                if df.empty:
-                    return self._get_default_stats()
-                
-                # Calculate team performance metrics
-                stats = {}
-                
-                # Points scored and allowed
-                team_scores = []
-                opponent_scores = []
-                
-                for _, row in df.iterrows():
-                    if row['venue'] == 'home':
-                        team_scores.append(row['home_score'])
-                        opponent_scores.append(row['away_score'])
-                    else:
-                        team_scores.append(row['away_score'])
-                        opponent_scores.append(row['home_score'])
-                
-                stats['avg_points_scored'] = np.mean(team_scores)
-                stats['avg_points_allowed'] = np.mean(opponent_scores)
-                stats['avg_point_differential'] = stats['avg_points_scored'] - stats['avg_points_allowed']
-                
-                # Win percentage
-                wins = sum(1 for i, score in enumerate(team_scores) if score > opponent_scores[i])
-                stats['win_percentage'] = wins / len(team_scores) if team_scores else 0
-                
-                # Home/Away splits
-                home_games = df[df['venue'] == 'home']
-                away_games = df[df['venue'] == 'away']
+                        COUNT(*),
+                        AVG(pts_for),
+                        AVG(pts_against),
+                        STDDEV_POP(pts_for),
+                        AVG(won::int),
+                        COUNT(*) FILTER (WHERE won AND is_home),
+                        COUNT(*) FILTER (WHERE is_home),
+                        COUNT(*) FILTER (WHERE won AND NOT is_home),
+                        COUNT(*) FILTER (WHERE NOT is_home),
+                        AVG(won::int) FILTER (WHERE recency <= %s)
+                    FROM (
+                        SELECT 
+                            is_home,
+                            CASE WHEN is_home THEN home_score ELSE away_score END AS pts_for,
+                            CASE WHEN is_home THEN away_score ELSE home_score END AS pts_against,
+                            CASE WHEN is_home THEN home_score > away_score ELSE away_score > home_score END AS won,
+                            recency
+                        FROM (
+                            SELECT 
+                                g.home_team_id = %s AS is_home,
+                                g.home_score,
+                                g.away_score,
+                                ROW_NUMBER() OVER (ORDER BY g.game_date DESC, g.id DESC) AS recency
+                            FROM games g
+                            WHERE (g.home_team_id = %s OR g.away_team_id = %s)
+                                AND g.status = 'completed'
+                                AND g.home_score IS NOT NULL
+                                AND g.away_score IS NOT NULL
+                        ) team_games
+                        WHERE recency <= %s
+                    ) recent
+                """, (recent_games, team_id, team_id, team_id, games_back))
                 
-                stats['home_win_pct'] = self._calculate_win_pct(home_games, 'home') if not home_games.empty else 0.5
-                stats['away_win_pct'] = self._calculate_win_pct(away_games, 'away') if not away_games.empty else 0.5
-                
-                # Recent form (last 5 games)
-                recent_games = df.head(5)
-                if not recent_games.empty:
-                    recent_wins = 0
-                    for _, row in recent_games.iterrows():
-                        if row['venue'] == 'home' and row['home_score'] > row['away_score']:
-                            recent_wins += 1
-                        elif row['venue'] == 'away' and row['away_score'] > row['home_score']:
-                            recent_wins += 1
-                    stats['recent_form'] = recent_wins / len(recent_games)
-                else:
-                    stats['recent_form'] = 0.5
-                
-                # Scoring consistency (standard deviation)
-                stats['scoring_consistency'] = 1 / (np.std(team_scores) + 1) if team_scores else 0.5
-                
-                return stats
-                
-        except Exception as e:
-            logger.error(f"Error calculating team stats: {str(e)}")
+                (games, avg_scored, avg_allowed, scoring_std, win_pct,
+                 home_wins, home_games, away_wins, away_games, recent_form) = cur.fetchone()
+        
+        if not games:
             return self._get_default_stats()
+        
+        # Calculate team performance metrics
+        stats = {}
+        
+        # Points scored and allowed
+        stats['avg_points_scored'] = float(avg_scored)
+        stats['avg_points_allowed'] = float(avg_allowed)
+        stats['avg_point_differential'] = stats['avg_points_scored'] - stats['avg_points_allowed']
+        
+        # Win percentage
+        stats['win_percentage'] = float(win_pct)
+        
+        # Home/Away splits
+        stats['home_win_pct'] = self._calculate_win_pct(home_wins, home_games)
+        stats['away_win_pct'] = self._calculate_win_pct(away_wins, away_games)
+        
+        # Recent form (last 5 games)
+        stats['recent_form'] = float(recent_form)
+        
+        # Scoring consistency (standard deviation)
+        stats['scoring_consistency'] = 1 / (float(scoring_std) + 1)
+        
+        return stats
     
-    def _calculate_win_pct(self, games_df: pd.DataFrame, venue: str) -> float:
+    def _calculate_win_pct(self, wins: int, games: int) -> float:
         """Calculate win percentage for home/away games"""
-        if games_df.empty:
+        if games == 0:
             return 0.5
         
-        wins = 0
-        for _, row in games_df.iterrows():
-            if venue == 'home' and row['home_score'] > row['away_score']:
-                wins += 1
-            elif venue == 'away' and row['away_score'] > row['home_score']:
-                wins += 1
-        
-        return wins / len(games_df)
+        return wins / games
     
     def _get_default_stats(self) -> Dict:
         """Return default stats when no data available"""
@@ -131,171 +195,397 @@ class FeatureEngineer:
             'scoring_consistency': 0.5
         }
     
-    def get_head_to_head_stats(self, team1_id: str, team2_id: str, games_back: int = 5) -> Dict:
+    def get_head_to_head_stats(self, team1_id: str, team2_id: str, games_back: int = 5, conn=None) -> Dict:
         """Get head-to-head statistics between two teams"""
-        try:
-            with self.db.get_connection() as conn:
-                query = """
-                    SELECT 
-                        home_team_id,
-                        away_team_id,
-                        home_score,
-                        away_score,
-                        game_date
-                    FROM games
-                    WHERE ((home_team_id = %s AND away_team_id = %s) 
-                           OR (home_team_id = %s AND away_team_id = %s))
-                        AND status = 'completed'
-                        AND home_score IS NOT NULL
-                        AND away_score IS NOT NULL
-                    ORDER BY game_date DESC
-                    LIMIT %s
-                """
-                
-                df = pd.read_sql(query, conn, params=[team1_id, team2_id, team2_id, team1_id, games_back])
-                
-                if df.empty:
-                    return {'h2h_win_pct': 0.5, 'avg_total_points': 220.0, 'avg_margin': 0.0}
-                
-                team1_wins = 0
-                total_points = []
-                margins = []
-                
-                for _, row in df.iterrows():
-                    if row['home_team_id'] == team1_id:
-                        if row['home_score'] > row['away_score']:
-                            team1_wins += 1
-                        margins.append(row['home_score'] - row['away_score'])
-                    else:
-                        if row['away_score'] > row['home_score']:
-                            team1_wins += 1
-                        margins.append(row['away_score'] - row['home_score'])
-                    
-                    total_points.append(row['home_score'] + row['away_score'])
-                
-                return {
-                    'h2h_win_pct': team1_wins / len(df),
-                    'avg_total_points': np.mean(total_points),
-                    'avg_margin': np.mean(margins)
-                }
-                
-        except Exception as e:
-            logger.error(f"Error calculating head-to-head stats: {str(e)}")
-            return {'h2h_win_pct': 0.5, 'avg_total_points': 220.0, 'avg_margin': 0.0}
+        # The pair is cached once, from the point of view of the lower id
+        team_a, team_b = sorted((team1_id, team2_id))
+        self._expire_stale_stats()
+        key = (team_a, team_b, games_back)
+        if key not in self._h2h_cache:
+            try:
+                self._h2h_cache[key] = self._compute_head_to_head_stats(team_a, team_b, games_back, conn)
+            except Exception as e:
+                logger.error(f"Error calculating head-to-head stats: {str(e)}")
+                self._rollback(conn)
+                return {'h2h_win_pct': 0.5, 'avg_total_points': 220.0, 'avg_margin': 0.0}
+        
+        pair_stats = self._h2h_cache[key]
+        if team1_id == team_a:
+            return {
+                'h2h_win_pct': pair_stats['win_pct'],
+                'avg_total_points': pair_stats['avg_total_points'],
+                'avg_margin': pair_stats['avg_margin']
+            }
+        
+        return {
+            'h2h_win_pct': pair_stats['loss_pct'],
+            'avg_total_points': pair_stats['avg_total_points'],
+            'avg_margin': -pair_stats['avg_margin']
+        }
+    
+    def _compute_head_to_head_stats(self, team_a: str, team_b: str, games_back: int, conn=None) -> Dict:
+        """Query and reduce recent meetings, from team_a's point of view"""
+        with self._connection(conn) as conn:
+            query = """
+                SELECT 
+                    home_team_id,
+                    away_team_id,
+                    home_score,
+                    away_score,
+                    game_date
+                FROM games
+                WHERE ((home_team_id = %s AND away_team_id = %s) 
+                       OR (home_team_id = %s AND away_team_id = %s))
+                    AND status = 'completed'
+                    AND home_score IS NOT NULL
+                    AND away_score IS NOT NULL
+                ORDER BY game_date DESC, id DESC
+                LIMIT %s
+            """
+            
+            df = pd.read_sql(query, conn, params=[team_a, team_b, team_b, team_a, games_back])
+        
+        if df.empty:
+            return {'win_pct': 0.5, 'loss_pct': 0.5, 'avg_total_points': 220.0, 'avg_margin': 0.0}
+        
+        is_team_a_home = df['home_team_id'].values == team_a
+        home_scores = df['home_score'].values
+        away_scores = df['away_score'].values
+        margins = np.where(is_team_a_home, home_scores - away_scores, away_scores - home_scores)
+        
+        # Wins and losses are kept apart so ties stay ties from either side
+        return {
+            'win_pct': (margins > 0).mean(),
+            'loss_pct': (margins < 0).mean(),
+            'avg_total_points': (home_scores + away_scores).mean(),
+            'avg_margin': margins.mean()
+        }
     
     def create_game_features(self, home_team_id: str, away_team_id: str) -> Dict:
         """Create feature vector for a game prediction"""
-        # Get team statistics
-        home_stats = self.get_team_stats(home_team_id)
-        away_stats = self.get_team_stats(away_team_id)
-        h2h_stats = self.get_head_to_head_stats(home_team_id, away_team_id)
-        
-        # Create feature dictionary
-        features = {}
-        
-        # Team strength features
-        features['home_avg_scored'] = home_stats['avg_points_scored']
-        features['home_avg_allowed'] = home_stats['avg_points_allowed']
-        features['away_avg_scored'] = away_stats['avg_points_scored']
-        features['away_avg_allowed'] = away_stats['avg_points_allowed']
-        
-        # Differential features
-        features['home_point_diff'] = home_stats['avg_point_differential']
-        features['away_point_diff'] = away_stats['avg_point_differential']
-        features['point_diff_advantage'] = features['home_point_diff'] - features['away_point_diff']
-        
-        # Win percentage features
-        features['home_win_pct'] = home_stats['win_percentage']
-        features['away_win_pct'] = away_stats['win_percentage']
-        features['win_pct_advantage'] = features['home_win_pct'] - features['away_win_pct']
-        
-        # Home court advantage
-        features['home_court_advantage'] = home_stats['home_win_pct'] - away_stats['away_win_pct']
-        
-        # Recent form
-        features['home_recent_form'] = home_stats['recent_form']
-        features['away_recent_form'] = away_stats['recent_form']
-        features['form_advantage'] = features['home_recent_form'] - features['away_recent_form']
-        
-        # Head-to-head
-        features['h2h_win_pct'] = h2h_stats['h2h_win_pct']
-        features['h2h_avg_total'] = h2h_stats['avg_total_points']
-        features['h2h_avg_margin'] = h2h_stats['avg_margin']
-        
-        # Consistency features
-        features['home_consistency'] = home_stats['scoring_consistency']
-        features['away_consistency'] = away_stats['scoring_consistency']
+        # Share one connection across whichever lookups are not cached yet
+        all_cached = (
+            (home_team_id, 10) in self._team_stats_cache
+            and (away_team_id, 10) in self._team_stats_cache
+            and (*sorted((home_team_id, away_team_id)), 5) in self._h2h_cache
+        )
+        
+        with (nullcontext() if all_cached else self.db.get_connection()) as conn:
+            # Get team statistics
+            home_stats = self.get_team_stats(home_team_id, conn=conn)
+            away_stats = self.get_team_stats(away_team_id, conn=conn)
+            h2h_stats = self.get_head_to_head_stats(home_team_id, away_team_id, conn=conn)
+        
+        features = self._build_feature_matrix(home_stats, away_stats, h2h_stats)
+        return dict(zip(FEATURE_NAMES, features[0].tolist()))
+    
+    def _build_feature_matrix(self, home_stats, away_stats, h2h_stats) -> np.ndarray:
+        """Combine team and head-to-head stats into a (games, FEATURE_NAMES) array
+        
+        Takes either stat dicts for one game or DataFrames with one row per game.
+        """
+        home = np.column_stack([home_stats[col] for col in STAT_COLUMNS]).astype(np.float64)
+        away = np.column_stack([away_stats[col] for col in STAT_COLUMNS]).astype(np.float64)
+        h2h = np.column_stack([h2h_stats[col] for col in H2H_COLUMNS]).astype(np.float64)
+        
+        home_scored, home_allowed, home_diff, home_win, home_home_win, _, home_form, home_consistency = home.T
+        away_scored, away_allowed, away_diff, away_win, _, away_away_win, away_form, away_consistency = away.T
         
         # Projected totals
-        features['projected_home_score'] = (home_stats['avg_points_scored'] + away_stats['avg_points_allowed']) / 2
-        features['projected_away_score'] = (away_stats['avg_points_scored'] + home_stats['avg_points_allowed']) / 2
-        features['projected_total'] = features['projected_home_score'] + features['projected_away_score']
-        features['projected_spread'] = features['projected_home_score'] - features['projected_away_score']
+        projected_home = (home_scored + away_allowed) / 2
+        projected_away = (away_scored + home_allowed) / 2
+        
+        return np.column_stack([
+            home_scored, home_allowed, away_scored, away_allowed,
+            home_diff, away_diff, home_diff - away_diff,
+            home_win, away_win, home_win - away_win,
+            home_home_win - away_away_win,
+            home_form, away_form, home_form - away_form,
+            h2h[:, 0], h2h[:, 1], h2h[:, 2],
+            home_consistency, away_consistency,
+            projected_home, projected_away, projected_home + projected_away, projected_home - projected_away
+        ])
+    
+    def _add_team_codes(self, games_df: pd.DataFrame):
+        """Add int32 home/away team codes so in-memory grouping skips id strings"""
+        team_ids = np.concatenate([games_df['home_team_id'].values, games_df['away_team_id'].values])
+        codes, _ = pd.factorize(team_ids)
+        codes = codes.astype(np.int32)
+        
+        games_df['home_team_code'] = codes[:len(games_df)]
+        games_df['away_team_code'] = codes[len(games_df):]
+    
+    def _rolling_team_stats(self, games_df: pd.DataFrame, games_back: int = 10,
+                            recent_games: int = 5) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Calculate each team's stats over the games played before every game
+        
+        Returns (home_stats, away_stats) frames aligned with games_df's index,
+        with the same columns as get_team_stats.
+        """
+        home = pd.DataFrame({
+            'row': games_df.index,
+            'game_date': games_df['game_date'].values,
+            'team': games_df['home_team_code'].values,
+            'pts_for': games_df['home_score'].values,
+            'pts_against': games_df['away_score'].values,
+            'is_home': True
+        })
+        away = pd.DataFrame({
+            'row': games_df.index,
+            'game_date': games_df['game_date'].values,
+            'team': games_df['away_team_code'].values,
+            'pts_for': games_df['away_score'].values,
+            'pts_against': games_df['home_score'].values,
+            'is_home': False
+        })
+        
+        # One row per team per game, in play order within each team; games on
+        # the same date keep the training query's order, as in the head-to-head pass
+        long = pd.concat([home, away], ignore_index=True)
+        long = long.sort_values(['team', 'game_date', 'row'], kind='mergesort')
+        
+        # Long histories go through the compiled kernel
+        if NUMBA_AVAILABLE and len(long) > NUMBA_MIN_ROWS:
+            values = compute_rolling(
+                long['team'].values,
+                long['pts_for'].values,
+                long['pts_against'].values,
+                long['is_home'].values,
+                games_back,
+                recent_games
+            )
+            stats = pd.DataFrame(values, columns=STAT_COLUMNS, index=long.index)
+        else:
+            stats = self._pandas_rolling_team_stats(long, games_back, recent_games)
+        
+        # Teams without earlier games fall back to the defaults
+        stats = stats.fillna(self._get_default_stats())
+        stats['row'] = long['row']
+        
+        home_stats = stats[long['is_home']].set_index('row').reindex(games_df.index)
+        away_stats = stats[~long['is_home']].set_index('row').reindex(games_df.index)
+        
+        return home_stats, away_stats
+    
+    def _pandas_rolling_team_stats(self, long: pd.DataFrame, games_back: int,
+                                   recent_games: int) -> pd.DataFrame:
+        """Rolling team stats via groupby+rolling over the long per-team frame"""
+        won = (long['pts_for'] > long['pts_against']).astype(float)
+        long['won'] = won
+        long['home_won'] = won * long['is_home']
+        long['away_won'] = won * ~long['is_home']
+        long['home_game'] = long['is_home'].astype(float)
+        long['away_game'] = 1.0 - long['home_game']
+        
+        # Shift by one game so a row only sees games played before it
+        value_cols = ['pts_for', 'pts_against', 'won', 'home_won', 'home_game', 'away_won', 'away_game']
+        prior = long.groupby('team', sort=False)[value_cols].shift(1)
+        prior_by_team = prior.groupby(long['team'], sort=False)
+        
+        window = prior_by_team.rolling(games_back, min_periods=1)
+        means = window[['pts_for', 'pts_against', 'won']].mean().droplevel(0)
+        sums = window[['home_won', 'home_game', 'away_won', 'away_game']].sum().droplevel(0)
+        scoring_std = window['pts_for'].std(ddof=0).droplevel(0)
+        recent_form = prior_by_team['won'].rolling(recent_games, min_periods=1).mean().droplevel(0)
+        
+        stats = pd.DataFrame({
+            'avg_points_scored': means['pts_for'],
+            'avg_points_allowed': means['pts_against'],
+            'avg_point_differential': means['pts_for'] - means['pts_against'],
+            'win_percentage': means['won'],
+            'home_win_pct': (sums['home_won'] / sums['home_game']).where(sums['home_game'] > 0, 0.5),
+            'away_win_pct': (sums['away_won'] / sums['away_game']).where(sums['away_game'] > 0, 0.5),
+            'recent_form': recent_form,
+            'scoring_consistency': 1 / (scoring_std + 1)
+        }, index=long.index)
+        
+        return stats
+    
+    def _rolling_head_to_head_stats(self, games_df: pd.DataFrame, games_back: int = 5) -> pd.DataFrame:
+        """Calculate head-to-head stats over each pair's meetings before every game
+        
+        Returns a frame aligned with games_df's index, with the same columns
+        as get_head_to_head_stats from the home team's point of view.
+        """
+        home_codes = games_df['home_team_code'].values
+        away_codes = games_df['away_team_code'].values
+        home_scores = games_df['home_score'].values
+        away_scores = games_df['away_score'].values
+        
+        # Key each meeting by the unordered pair as one integer, seen from the lower code
+        home_is_a = home_codes < away_codes
+        team_count = int(max(home_codes.max(), away_codes.max())) + 1
+        margin_a = np.where(home_is_a, home_scores - away_scores, away_scores - home_scores)
+        meetings = pd.DataFrame({
+            'pair': np.minimum(home_codes, away_codes).astype(np.int64) * team_count + np.maximum(home_codes, away_codes),
+            'game_date': games_df['game_date'].values,
+            'a_won': (margin_a > 0).astype(float),
+            'a_lost': (margin_a < 0).astype(float),
+            'total': (home_scores + away_scores).astype(float),
+            'margin_a': margin_a.astype(float)
+        }, index=games_df.index)
+        meetings = meetings.sort_values('game_date', kind='mergesort')
+        
+        # Shift by one meeting so a row only sees earlier games of the pair
+        value_cols = ['a_won', 'a_lost', 'total', 'margin_a']
+        prior = meetings.groupby('pair', sort=False)[value_cols].shift(1)
+        window = prior.groupby(meetings['pair'], sort=False).rolling(games_back, min_periods=1).mean()
+        window = window.droplevel(0).reindex(games_df.index)
+        
+        h2h_stats = pd.DataFrame({
+            'h2h_win_pct': np.where(home_is_a, window['a_won'], window['a_lost']),
+            'avg_total_points': window['total'].values,
+            'avg_margin': np.where(home_is_a, window['margin_a'], -window['margin_a'])
+        }, index=games_df.index)
         
-        return features
+        # Pairs without earlier meetings fall back to the defaults
+        return h2h_stats.fillna({'h2h_win_pct': 0.5, 'avg_total_points': 220.0, 'avg_margin': 0.0})
     
     def prepare_training_data(self, start_date: str = None, end_date: str = None) -> pd.DataFrame:
         """Prepare training dataset from historical games"""
+        # Start from fresh stats for each run
+        self.invalidate()
+        
         try:
             with self.db.get_connection() as conn:
+                # Only scored games between two known teams
+                filters = """
+                    g.status = 'completed'
+                    AND g.home_score IS NOT NULL
+                    AND g.away_score IS NOT NULL
+                    AND EXISTS (SELECT 1 FROM teams ht WHERE ht.id = g.home_team_id)
+                    AND EXISTS (SELECT 1 FROM teams at WHERE at.id = g.away_team_id)
+                """
+                params = []
+                if start_date:
+                    filters += " AND g.game_date >= %s"
+                    params.append(start_date)
+                if end_date:
+                    filters += " AND g.game_date <= %s"
+                    params.append(end_date)
+                
+                # Reuse the features built for this exact set of games, if any;
+                # the digest changes with any score, team or date correction
+                with conn.cursor() as cur:
+                    cur.execute(f"""
+                        SELECT 
+                            COUNT(*),
+                            MD5(STRING_AGG(
+                                CONCAT_WS(':', g.id, g.home_team_id, g.away_team_id,
+                                          g.home_score, g.away_score, g.game_date),
+                                ',' ORDER BY g.id
+                            ))
+                        FROM games g
+                        WHERE {filters}
+                    """, params)
+                    game_count, games_digest = cur.fetchone()
+                
+                if not game_count:
+                    logger.warning("No completed games found for training")
+                    return pd.DataFrame()
+                
+                cache_path = self._feature_cache_path(game_count, games_digest)
+                cached = self._read_feature_cache(cache_path)
+                if cached is not None:
+                    return cached
+                
                 # Get completed games with scores
-                query = """
+                query = f"""
                     SELECT 
                         g.id,
                         g.home_team_id,
                         g.away_team_id,
                         g.home_score,
                         g.away_score,
-                        g.game_date,
-                        ht.name as home_team_name,
-                        at.name as away_team_name
+                        g.game_date
                     FROM games g
-                    JOIN teams ht ON g.home_team_id = ht.id
-                    JOIN teams at ON g.away_team_id = at.id
-                    WHERE g.status = 'completed'
-                        AND g.home_score IS NOT NULL
-                        AND g.away_score IS NOT NULL
+                    WHERE {filters}
+                    ORDER BY g.game_date, g.id
                 """
                 
-                params = []
-                if start_date:
-                    query += " AND g.game_date >= %s"
-                    params.append(start_date)
-                if end_date:
-                    query += " AND g.game_date <= %s"
-                    params.append(end_date)
-                
-                query += " ORDER BY g.game_date"
+                # Stream the history through a server-side cursor in chunks
+                columns = ['id', 'home_team_id', 'away_team_id', 'home_score', 'away_score', 'game_date']
+                chunks = []
+                with conn.cursor(name='training_games') as cur:
+                    cur.itersize = 10000
+                    cur.execute(query, params)
+                    while True:
+                        rows = cur.fetchmany(cur.itersize)
+                        if not rows:
+                            break
+                        chunks.append(pd.DataFrame(rows, columns=columns))
                 
-                games_df = pd.read_sql(query, conn, params=params)
+                games_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
                 
                 if games_df.empty:
                     logger.warning("No completed games found for training")
                     return pd.DataFrame()
                 
-                # Create features for each game
-                training_data = []
+                # Team stats for every game from the one games query
+                self._add_team_codes(games_df)
+                home_stats, away_stats = self._rolling_team_stats(games_df)
+                h2h_stats = self._rolling_head_to_head_stats(games_df)
                 
-                for _, game in games_df.iterrows():
-                    features = self.create_game_features(game['home_team_id'], game['away_team_id'])
-                    
-                    # Add target variables
-                    features['home_score'] = game['home_score']
-                    features['away_score'] = game['away_score']
-                    features['total_points'] = game['home_score'] + game['away_score']
-                    features['home_win'] = 1 if game['home_score'] > game['away_score'] else 0
-                    features['point_spread'] = game['home_score'] - game['away_score']
-                    features['game_id'] = game['id']
-                    features['game_date'] = game['game_date']
-                    
-                    training_data.append(features)
+                # Create features for all games at once
+                training_data = pd.DataFrame(
+                    self._build_feature_matrix(home_stats, away_stats, h2h_stats),
+                    columns=FEATURE_NAMES,
+                    index=games_df.index
+                )
                 
-                return pd.DataFrame(training_data)
+                # Add target variables
+                home_scores = games_df['home_score']
+                away_scores = games_df['away_score']
+                training_data['home_score'] = home_scores
+                training_data['away_score'] = away_scores
+                training_data['total_points'] = home_scores + away_scores
+                training_data['home_win'] = (home_scores > away_scores).astype(int)
+                training_data['point_spread'] = home_scores - away_scores
+                training_data['game_id'] = games_df['id']
+                training_data['game_date'] = games_df['game_date']
+                
+                self._write_feature_cache(training_data, cache_path)
+                
+                return training_data
                 
         except Exception as e:
             logger.error(f"Error preparing training data: {str(e)}")
             return pd.DataFrame()
 
+    def _feature_cache_path(self, game_count: int, games_digest: str) -> str:
+        """Cache file for the training set over the given games"""
+        return os.path.join(self.cache_dir, f"features_v{FEATURE_CACHE_VERSION}_{game_count}_{games_digest}.parquet")
+    
+    def _read_feature_cache(self, cache_path: str) -> Optional[pd.DataFrame]:
+        """Load a cached training set, or None when there is none to use"""
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            training_data = pd.read_parquet(cache_path)
+            logger.info(f"Loaded cached training features: {cache_path}")
+            return training_data
+        except Exception as e:
+            logger.warning(f"Error reading feature cache {cache_path}: {str(e)}")
+            return None
+    
+    def _write_feature_cache(self, training_data: pd.DataFrame, cache_path: str):
+        """Persist a training set; failures only cost the next run a rebuild"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            training_data.to_parquet(cache_path, compression='zstd', index=False)
+        except Exception as e:
+            logger.warning(f"Error writing feature cache {cache_path}: {str(e)}")
+            return
+        
+        # Only the newest training set is kept; older windows never hit again
+        for stale_path in glob.glob(os.path.join(self.cache_dir, "features_v*_*.parquet")):
+            if os.path.abspath(stale_path) != os.path.abspath(cache_path):
+                try:
+                    os.remove(stale_path)
+                except OSError as e:
+                    logger.warning(f"Error removing stale feature cache {stale_path}: {str(e)}")
+
 if __name__ == "__main__":
     engineer = FeatureEngineer()
     
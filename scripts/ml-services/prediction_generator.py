@@ -4,11 +4,15 @@ Prediction Generator for Project Apex
 Generates predictions for upcoming games and stores them in database
 """
 
+import csv
+import io
 import logging
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import pandas as pd
+from psycopg2.extras import execute_values
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from ml_models.prediction_models import MLModelManager
@@ -16,9 +20,33 @@ from database_utils import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+PREDICTION_COLUMNS = "game_id, model_name, prediction_type, predicted_value, confidence"
+
+PREDICTION_ON_CONFLICT_SQL = """
+    ON CONFLICT (game_id, model_name, prediction_type) 
+    DO UPDATE SET 
+        predicted_value = EXCLUDED.predicted_value,
+        confidence = EXCLUDED.confidence,
+        created_at = NOW()
+"""
+
+PREDICTION_UPSERT_SQL = f"""
+    INSERT INTO predictions ({PREDICTION_COLUMNS})
+    VALUES %s
+""" + PREDICTION_ON_CONFLICT_SQL
+
+PREDICTION_STAGING_UPSERT_SQL = f"""
+    INSERT INTO predictions ({PREDICTION_COLUMNS})
+    SELECT {PREDICTION_COLUMNS} FROM predictions_staging
+""" + PREDICTION_ON_CONFLICT_SQL
+
+# Batches at least this large are loaded with COPY into a staging table
+PREDICTION_COPY_MIN_ROWS = 1000
+
 class PredictionGenerator:
     def __init__(self):
         self.model_manager = MLModelManager()
+        self.model_manager.load_models()
         self.db = DatabaseManager()
     
     def generate_predictions_for_upcoming_games(self, days_ahead: int = 7):
@@ -26,6 +54,9 @@ class PredictionGenerator:
         try:
             logger.info(f"Generating predictions for games in next {days_ahead} days...")
             
+            # Team stats are memoized per run; start from the latest results
+            self.model_manager.clear_feature_cache()
+            
             # Get upcoming games
             with self.db.get_connection() as conn:
                 query = """
@@ -57,89 +88,98 @@ class PredictionGenerator:
             
             # Generate predictions for each game
             predictions_made = 0
+            rows = []
+            
+            # Predict each distinct matchup once, overlapping their stats queries
+            games = list(games_df.itertuples(index=False))
+            matchups = {(game.home_team_id, game.away_team_id) for game in games}
+            predictions_by_matchup = {}
+            
+            with ThreadPoolExecutor(max_workers=min(16, len(matchups))) as pool:
+                futures = {
+                    pool.submit(self.model_manager.predict_game, home_team_id, away_team_id): (home_team_id, away_team_id)
+                    for home_team_id, away_team_id in matchups
+                }
+                
+                for future in as_completed(futures):
+                    home_team_id, away_team_id = futures[future]
+                    try:
+                        predictions_by_matchup[(home_team_id, away_team_id)] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error generating prediction for {home_team_id} vs {away_team_id}: {str(e)}")
             
-            for _, game in games_df.iterrows():
+            for game in games:
+                predictions = predictions_by_matchup.get((game.home_team_id, game.away_team_id))
+                if predictions is None:
+                    continue
+                
                 try:
-                    predictions = self.model_manager.predict_game(
-                        game['home_team_id'], 
-                        game['away_team_id']
-                    )
+                    rows.extend(self._prediction_rows(game.id, predictions))
                     
-                    # Store predictions in database
-                    self.store_predictions(game['id'], predictions)
-                    
-                    logger.info(f"Generated predictions for {game['home_team']} vs {game['away_team']}")
+                    logger.info(f"Generated predictions for {game.home_team} vs {game.away_team}")
                     predictions_made += 1
                     
                 except Exception as e:
-                    logger.error(f"Error generating prediction for game {game['id']}: {str(e)}")
+                    logger.error(f"Error generating prediction for game {game.id}: {str(e)}")
                     continue
             
-            logger.info(f"Successfully generated {predictions_made} predictions")
+            # Store all predictions in one round trip
+            if rows and self.store_predictions_batch(rows):
+                logger.info(f"Successfully generated {predictions_made} predictions")
             
         except Exception as e:
             logger.error(f"Error generating predictions: {str(e)}")
     
+    def _prediction_rows(self, game_id: str, predictions: dict) -> list:
+        """Flatten a game's predictions into predictions table rows"""
+        model_name = predictions['model_name']
+        confidence = predictions['confidence_scores']
+        
+        return [
+            (game_id, model_name, 'winner', predictions['home_win_probability'], confidence['outcome']),
+            (game_id, model_name, 'spread', predictions['predicted_spread'], confidence['spread']),
+            (game_id, model_name, 'total', predictions['predicted_total'], confidence['total'])
+        ]
+    
     def store_predictions(self, game_id: str, predictions: dict):
         """Store predictions in the database"""
+        try:
+            rows = self._prediction_rows(game_id, predictions)
+        except Exception as e:
+            logger.error(f"Error storing predictions: {str(e)}")
+            return False
+        
+        return self.store_predictions_batch(rows)
+    
+    def store_predictions_batch(self, rows: list) -> bool:
+        """Upsert prediction rows in a single statement and commit"""
         try:
             with self.db.get_connection() as conn:
                 with conn.cursor() as cur:
-                    # Store winner prediction
-                    cur.execute("""
-                        INSERT INTO predictions (game_id, model_name, prediction_type, predicted_value, confidence)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (game_id, model_name, prediction_type) 
-                        DO UPDATE SET 
-                            predicted_value = EXCLUDED.predicted_value,
-                            confidence = EXCLUDED.confidence,
-                            created_at = NOW()
-                    """, (
-                        game_id,
-                        predictions['model_name'],
-                        'winner',
-                        predictions['home_win_probability'],
-                        predictions['confidence_scores']['outcome']
-                    ))
-                    
-                    # Store spread prediction
-                    cur.execute("""
-                        INSERT INTO predictions (game_id, model_name, prediction_type, predicted_value, confidence)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (game_id, model_name, prediction_type) 
-                        DO UPDATE SET 
-                            predicted_value = EXCLUDED.predicted_value,
-                            confidence = EXCLUDED.confidence,
-                            created_at = NOW()
-                    """, (
-                        game_id,
-                        predictions['model_name'],
-                        'spread',
-                        predictions['predicted_spread'],
-                        predictions['confidence_scores']['spread']
-                    ))
-                    
-                    # Store total prediction
-                    cur.execute("""
-                        INSERT INTO predictions (game_id, model_name, prediction_type, predicted_value, confidence)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (game_id, model_name, prediction_type) 
-                        DO UPDATE SET 
-                            predicted_value = EXCLUDED.predicted_value,
-                            confidence = EXCLUDED.confidence,
-                            created_at = NOW()
-                    """, (
-                        game_id,
-                        predictions['model_name'],
-                        'total',
-                        predictions['predicted_total'],
-                        predictions['confidence_scores']['total']
-                    ))
-                    
+                    if len(rows) >= PREDICTION_COPY_MIN_ROWS:
+                        self._copy_predictions(cur, rows)
+                    else:
+                        execute_values(cur, PREDICTION_UPSERT_SQL, rows, page_size=500)
                     conn.commit()
+            return True
                     
         except Exception as e:
             logger.error(f"Error storing predictions: {str(e)}")
+            return False
+    
+    def _copy_predictions(self, cur, rows: list):
+        """Stream rows into a temporary staging table with COPY, then upsert"""
+        cur.execute(f"""
+            CREATE TEMP TABLE predictions_staging ON COMMIT DROP AS
+            SELECT {PREDICTION_COLUMNS} FROM predictions WITH NO DATA
+        """)
+        
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        
+        cur.copy_expert(f"COPY predictions_staging ({PREDICTION_COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cur.execute(PREDICTION_STAGING_UPSERT_SQL)
     
     def update_prediction_accuracy(self):
         """Update prediction accuracy for completed games"""
@@ -148,49 +188,23 @@ class PredictionGenerator:
             
             with self.db.get_connection() as conn:
                 with conn.cursor() as cur:
-                    # Update winner predictions
+                    # Settle winner, spread and total predictions in one pass
                     cur.execute("""
                         UPDATE predictions p
                         SET 
-                            actual_value = CASE WHEN g.home_score > g.away_score THEN 1 ELSE 0 END,
-                            is_correct = CASE 
-                                WHEN p.predicted_value > 0.5 AND g.home_score > g.away_score THEN TRUE
-                                WHEN p.predicted_value <= 0.5 AND g.home_score <= g.away_score THEN TRUE
-                                ELSE FALSE
+                            actual_value = CASE p.prediction_type
+                                WHEN 'winner' THEN CASE WHEN g.home_won THEN 1 ELSE 0 END
+                                WHEN 'spread' THEN g.point_margin
+                                WHEN 'total' THEN g.point_total
+                            END,
+                            is_correct = CASE p.prediction_type
+                                WHEN 'winner' THEN (p.predicted_value > 0.5) = g.home_won
+                                WHEN 'spread' THEN ABS(p.predicted_value - g.point_margin) <= 3
+                                WHEN 'total' THEN ABS(p.predicted_value - g.point_total) <= 5
                             END
                         FROM games g
                         WHERE p.game_id = g.id
-                            AND p.prediction_type = 'winner'
-                            AND g.status = 'completed'
-                            AND g.home_score IS NOT NULL
-                            AND g.away_score IS NOT NULL
-                            AND p.actual_value IS NULL
-                    """)
-                    
-                    # Update spread predictions
-                    cur.execute("""
-                        UPDATE predictions p
-                        SET 
-                            actual_value = g.home_score - g.away_score,
-                            is_correct = ABS(p.predicted_value - (g.home_score - g.away_score)) <= 3
-                        FROM games g
-                        WHERE p.game_id = g.id
-                            AND p.prediction_type = 'spread'
-                            AND g.status = 'completed'
-                            AND g.home_score IS NOT NULL
-                            AND g.away_score IS NOT NULL
-                            AND p.actual_value IS NULL
-                    """)
-                    
-                    # Update total predictions
-                    cur.execute("""
-                        UPDATE predictions p
-                        SET 
-                            actual_value = g.home_score + g.away_score,
-                            is_correct = ABS(p.predicted_value - (g.home_score + g.away_score)) <= 5
-                        FROM games g
-                        WHERE p.game_id = g.id
-                            AND p.prediction_type = 'total'
+                            AND p.prediction_type IN ('winner', 'spread', 'total')
                             AND g.status = 'completed'
                             AND g.home_score IS NOT NULL
                             AND g.away_score IS NOT NULL
@@ -2,37 +2,141 @@
 """
 ML Prediction Models for Project Apex
 Implements various machine learning models for sports predictions
+
+Saved models are memory-mapped on load. A serving process that calls
+MLModelManager.load_models() before forking workers (e.g. gunicorn
+--preload) shares one copy of the model arrays across all of them;
+picking up retrained models means restarting the worker pool. Each forked
+child starts its own prediction batcher thread on first use. Team stats
+and predictions memoized before the fork are inherited but expire at the
+top of the hour like any others.
 """
 
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, GradientBoostingClassifier, GradientBoostingRegressor
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
 from sklearn.linear_model import LogisticRegression, LinearRegression
 from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
-from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.inspection import permutation_importance
 from sklearn.metrics import accuracy_score, mean_squared_error, classification_report, mean_absolute_error
+import hashlib
+import importlib.util
 import joblib
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 import logging
+import queue
+import threading
+import time
+import warnings
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database_utils import DatabaseManager
-from ml_models.feature_engineering import FeatureEngineer
+from ml_models.feature_engineering import FeatureEngineer, stats_bucket
+
+try:
+    import onnxruntime
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Large offline batches can be scored on a GPU with cuML's forest inference
+GPU_AVAILABLE = False
+if os.environ.get('APEX_USE_GPU'):
+    try:
+        import cuml
+        from cuml import ForestInference
+        GPU_AVAILABLE = True
+    except ImportError:
+        pass
+
+# joblib does the lz4 compression itself; it only needs the package installed
+MODEL_COMPRESSION = ('lz4', 3) if importlib.util.find_spec('lz4') is not None else 3
 
 logger = logging.getLogger(__name__)
 
+def _features_from_records(records: List[Dict], feature_columns) -> np.ndarray:
+    """Gather feature dicts into a float32 matrix, missing or NaN values as 0"""
+    out = np.zeros((len(records), len(feature_columns)), dtype=np.float32)
+    
+    for i, feats in enumerate(records):
+        for j, col in enumerate(feature_columns):
+            value = feats.get(col)
+            if value is not None and value == value:
+                out[i, j] = value
+    
+    return out
+
+# Saved model layout: 3 is a plain dict of estimator and feature columns;
+# 1 and 2 pickled the whole predictor wrapper, and 1 also carried a StandardScaler
+MODEL_FORMAT_VERSION = 3
+
+# train_all_models fits three models at once, so each fit's OpenMP pool gets a third of the cores
+TRAINING_THREADS = max(1, (os.cpu_count() or 1) // 3)
+
+# Longest predict_game waits for its batch before falling back to defaults
+PREDICTION_TIMEOUT = 30.0
+
+# Models are refit on at most this many of their most important features
+MAX_MODEL_FEATURES = 8
+
+# Share of the training rows held out to score feature importances on
+IMPORTANCE_HOLDOUT = 0.2
+
+def _fit_pruned(predictor, X_train: np.ndarray, y_train, X_test: np.ndarray):
+    """Fit a predictor's model on its most important features by permutation importance
+
+    Importances are scored on a slice held out of the training rows, so
+    the test rows stay unseen. The model is then refit on all training
+    rows, restricted to the kept columns. Narrows predictor.feature_columns
+    to match, and returns the train and test matrices restricted to the
+    kept columns.
+    """
+    if X_train.shape[1] <= MAX_MODEL_FEATURES:
+        predictor.model.fit(X_train, y_train)
+        return X_train, X_test
+    
+    X_fit, X_holdout, y_fit, y_holdout = train_test_split(
+        X_train, y_train, test_size=IMPORTANCE_HOLDOUT, random_state=42
+    )
+    predictor.model.fit(X_fit, y_fit)
+    importances = permutation_importance(
+        predictor.model, X_holdout, y_holdout, n_repeats=5, random_state=42
+    ).importances_mean
+    keep = np.sort(np.argsort(importances)[-MAX_MODEL_FEATURES:])
+    
+    predictor.feature_columns = tuple(predictor.feature_columns[i] for i in keep)
+    X_train = X_train[:, keep]
+    X_test = X_test[:, keep]
+    
+    predictor.model.fit(X_train, y_train)
+    logger.info(f"Kept features: {', '.join(predictor.feature_columns)}")
+    
+    return X_train, X_test
+
 class GameOutcomePredictor:
     """Predicts game winners using classification models"""
     
-    def __init__(self):
+    def __init__(self, enable_cv: bool = False):
         self.model = None
-        self.scaler = StandardScaler()
         self.feature_columns = None
+        self.onnx_session = None
         self.is_trained = False
+        # Cross-validation refits the model once per fold, so it is opt-in
+        self.enable_cv = enable_cv
     
-    def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
+    def prepare_features(self, df: pd.DataFrame) -> np.ndarray:
         """Prepare features for game outcome prediction"""
         feature_cols = [
             'home_avg_scored', 'home_avg_allowed', 'away_avg_scored', 'away_avg_allowed',
@@ -44,9 +148,9 @@ class GameOutcomePredictor:
         
         # Filter to available columns
         available_cols = [col for col in feature_cols if col in df.columns]
-        self.feature_columns = available_cols
+        self.feature_columns = tuple(available_cols)
         
-        return df[available_cols].fillna(0)
+        return df[available_cols].fillna(0).to_numpy(dtype=np.float32)
     
     def train(self, training_data: pd.DataFrame):
         """Train the game outcome prediction model"""
@@ -59,37 +163,37 @@ class GameOutcomePredictor:
             X = self.prepare_features(training_data)
             y = training_data['home_win']
             
-            if X.empty:
+            if X.size == 0:
                 logger.error("No valid features for training")
                 return False
             
             # Split data
             X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
             
-            # Scale features
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
-            
-            # Train ensemble model
-            self.model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                min_samples_split=5,
+            # Train histogram gradient boosting model
+            self.model = HistGradientBoostingClassifier(
+                max_iter=200,
+                max_depth=8,
+                learning_rate=0.05,
+                early_stopping=True,
+                validation_fraction=0.1,
                 random_state=42
             )
             
-            self.model.fit(X_train_scaled, y_train)
+            X_train, X_test = _fit_pruned(self, X_train, y_train, X_test)
             
             # Evaluate model
-            train_accuracy = self.model.score(X_train_scaled, y_train)
-            test_accuracy = self.model.score(X_test_scaled, y_test)
+            train_accuracy = self.model.score(X_train, y_train)
+            test_accuracy = self.model.score(X_test, y_test)
             
             logger.info(f"Game Outcome Model - Train Accuracy: {train_accuracy:.3f}, Test Accuracy: {test_accuracy:.3f}")
             
-            # Cross-validation
-            cv_scores = cross_val_score(self.model, X_train_scaled, y_train, cv=5)
-            logger.info(f"Cross-validation accuracy: {cv_scores.mean():.3f} (+/- {cv_scores.std() * 2:.3f})")
+            # Cross-validation, on a copy so the fitted model is untouched
+            if self.enable_cv:
+                cv_scores = cross_val_score(clone(self.model), X_train, y_train, cv=5, n_jobs=-1)
+                logger.info(f"Cross-validation accuracy: {cv_scores.mean():.3f} (+/- {cv_scores.std() * 2:.3f})")
             
+            self.onnx_session = None  # exported for the previous fit
             self.is_trained = True
             return True
             
@@ -97,21 +201,30 @@ class GameOutcomePredictor:
             logger.error(f"Error training game outcome model: {str(e)}")
             return False
     
-    def predict(self, features: pd.DataFrame) -> Dict:
-        """Predict game outcome"""
+    def predict(self, features: List[Dict], gpu_model=None) -> Dict:
+        """Predict game outcomes, one entry per feature row"""
         if not self.is_trained or self.model is None:
-            return {'home_win_probability': 0.5, 'confidence': 0.0}
+            return self._default_prediction(len(features))
         
         try:
-            X = self.prepare_features(features)
-            X_scaled = self.scaler.transform(X)
-            
-            # Get probability predictions
-            probabilities = self.model.predict_proba(X_scaled)
-            home_win_prob = probabilities[0][1] if len(probabilities[0]) > 1 else 0.5
+            X = _features_from_records(features, self.feature_columns)
+            
+            # Get probability predictions; trees need no feature scaling
+            onnx_session = self.onnx_session
+            if gpu_model is not None:
+                with cuml.using_output_type('numpy'):
+                    probabilities = gpu_model.predict_proba(X)
+            elif onnx_session is not None:
+                probabilities = onnx_session.run(None, {'X': X})[1]
+            else:
+                probabilities = self.model.predict_proba(X)
+            if probabilities.shape[1] > 1:
+                home_win_prob = probabilities[:, 1]
+            else:
+                home_win_prob = np.full(len(X), 0.5)
             
             # Calculate confidence based on how far from 0.5 the prediction is
-            confidence = abs(home_win_prob - 0.5) * 2
+            confidence = np.abs(home_win_prob - 0.5) * 2
             
             return {
                 'home_win_probability': home_win_prob,
@@ -121,18 +234,26 @@ class GameOutcomePredictor:
             
         except Exception as e:
             logger.error(f"Error predicting game outcome: {str(e)}")
-            return {'home_win_probability': 0.5, 'confidence': 0.0}
+            return self._default_prediction(len(features))
+    
+    def _default_prediction(self, n: int) -> Dict:
+        """Coin-flip predictions for n games"""
+        return {
+            'home_win_probability': np.full(n, 0.5),
+            'away_win_probability': np.full(n, 0.5),
+            'confidence': np.zeros(n)
+        }
 
 class SpreadPredictor:
     """Predicts point spreads using regression models"""
     
     def __init__(self):
         self.model = None
-        self.scaler = StandardScaler()
         self.feature_columns = None
+        self.onnx_session = None
         self.is_trained = False
     
-    def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
+    def prepare_features(self, df: pd.DataFrame) -> np.ndarray:
         """Prepare features for spread prediction"""
         feature_cols = [
             'home_avg_scored', 'home_avg_allowed', 'away_avg_scored', 'away_avg_allowed',
@@ -141,9 +262,9 @@ class SpreadPredictor:
         ]
         
         available_cols = [col for col in feature_cols if col in df.columns]
-        self.feature_columns = available_cols
+        self.feature_columns = tuple(available_cols)
         
-        return df[available_cols].fillna(0)
+        return df[available_cols].fillna(0).to_numpy(dtype=np.float32)
     
     def train(self, training_data: pd.DataFrame):
         """Train the spread prediction model"""
@@ -155,34 +276,34 @@ class SpreadPredictor:
             X = self.prepare_features(training_data)
             y = training_data['point_spread']
             
-            if X.empty:
+            if X.size == 0:
                 logger.error("No valid features for training")
                 return False
             
             X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
             
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
-            
-            # Train gradient boosting regressor
-            self.model = GradientBoostingRegressor(
-                n_estimators=100,
-                max_depth=6,
-                learning_rate=0.1,
+            # Train histogram gradient boosting regressor
+            self.model = HistGradientBoostingRegressor(
+                max_iter=200,
+                max_depth=8,
+                learning_rate=0.05,
+                early_stopping=True,
+                validation_fraction=0.1,
                 random_state=42
             )
             
-            self.model.fit(X_train_scaled, y_train)
+            X_train, X_test = _fit_pruned(self, X_train, y_train, X_test)
             
             # Evaluate model
-            train_predictions = self.model.predict(X_train_scaled)
-            test_predictions = self.model.predict(X_test_scaled)
+            train_predictions = self.model.predict(X_train)
+            test_predictions = self.model.predict(X_test)
             
             train_mae = mean_absolute_error(y_train, train_predictions)
             test_mae = mean_absolute_error(y_test, test_predictions)
             
             logger.info(f"Spread Model - Train MAE: {train_mae:.2f}, Test MAE: {test_mae:.2f}")
             
+            self.onnx_session = None  # exported for the previous fit
             self.is_trained = True
             return True
             
@@ -190,19 +311,25 @@ class SpreadPredictor:
             logger.error(f"Error training spread model: {str(e)}")
             return False
     
-    def predict(self, features: pd.DataFrame) -> Dict:
-        """Predict point spread"""
+    def predict(self, features: List[Dict], gpu_model=None) -> Dict:
+        """Predict point spreads, one entry per feature row"""
         if not self.is_trained or self.model is None:
-            return {'predicted_spread': 0.0, 'confidence': 0.0}
+            return self._default_prediction(len(features))
         
         try:
-            X = self.prepare_features(features)
-            X_scaled = self.scaler.transform(X)
-            
-            predicted_spread = self.model.predict(X_scaled)[0]
+            X = _features_from_records(features, self.feature_columns)
+            
+            onnx_session = self.onnx_session
+            if gpu_model is not None:
+                with cuml.using_output_type('numpy'):
+                    predicted_spread = gpu_model.predict(X).ravel()
+            elif onnx_session is not None:
+                predicted_spread = onnx_session.run(None, {'X': X})[0].ravel()
+            else:
+                predicted_spread = self.model.predict(X)
             
             # Estimate confidence based on feature importance and values
-            confidence = min(0.8, abs(predicted_spread) / 20.0)  # Higher confidence for larger spreads
+            confidence = np.minimum(0.8, np.abs(predicted_spread) / 20.0)  # Higher confidence for larger spreads
             
             return {
                 'predicted_spread': predicted_spread,
@@ -211,18 +338,22 @@ class SpreadPredictor:
             
         except Exception as e:
             logger.error(f"Error predicting spread: {str(e)}")
-            return {'predicted_spread': 0.0, 'confidence': 0.0}
+            return self._default_prediction(len(features))
+    
+    def _default_prediction(self, n: int) -> Dict:
+        """Pick'em spreads for n games"""
+        return {'predicted_spread': np.zeros(n), 'confidence': np.zeros(n)}
 
 class TotalPointsPredictor:
     """Predicts total points (over/under) using regression models"""
     
     def __init__(self):
         self.model = None
-        self.scaler = StandardScaler()
         self.feature_columns = None
+        self.onnx_session = None
         self.is_trained = False
     
-    def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
+    def prepare_features(self, df: pd.DataFrame) -> np.ndarray:
         """Prepare features for total points prediction"""
         feature_cols = [
             'home_avg_scored', 'home_avg_allowed', 'away_avg_scored', 'away_avg_allowed',
@@ -231,9 +362,9 @@ class TotalPointsPredictor:
         ]
         
         available_cols = [col for col in feature_cols if col in df.columns]
-        self.feature_columns = available_cols
+        self.feature_columns = tuple(available_cols)
         
-        return df[available_cols].fillna(0)
+        return df[available_cols].fillna(0).to_numpy(dtype=np.float32)
     
     def train(self, training_data: pd.DataFrame):
         """Train the total points prediction model"""
@@ -245,34 +376,34 @@ class TotalPointsPredictor:
             X = self.prepare_features(training_data)
             y = training_data['total_points']
             
-            if X.empty:
+            if X.size == 0:
                 logger.error("No valid features for training")
                 return False
             
             X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
             
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
-            
-            # Train random forest regressor
-            self.model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                min_samples_split=5,
+            # Train histogram gradient boosting regressor
+            self.model = HistGradientBoostingRegressor(
+                max_iter=200,
+                max_depth=8,
+                learning_rate=0.05,
+                early_stopping=True,
+                validation_fraction=0.1,
                 random_state=42
             )
             
-            self.model.fit(X_train_scaled, y_train)
+            X_train, X_test = _fit_pruned(self, X_train, y_train, X_test)
             
             # Evaluate model
-            train_predictions = self.model.predict(X_train_scaled)
-            test_predictions = self.model.predict(X_test_scaled)
+            train_predictions = self.model.predict(X_train)
+            test_predictions = self.model.predict(X_test)
             
             train_mae = mean_absolute_error(y_train, train_predictions)
             test_mae = mean_absolute_error(y_test, test_predictions)
             
             logger.info(f"Total Points Model - Train MAE: {train_mae:.2f}, Test MAE: {test_mae:.2f}")
             
+            self.onnx_session = None  # exported for the previous fit
             self.is_trained = True
             return True
             
@@ -280,28 +411,38 @@ class TotalPointsPredictor:
             logger.error(f"Error training total points model: {str(e)}")
             return False
     
-    def predict(self, features: pd.DataFrame) -> Dict:
-        """Predict total points"""
+    def predict(self, features: List[Dict], gpu_model=None) -> Dict:
+        """Predict total points, one entry per feature row"""
         if not self.is_trained or self.model is None:
-            return {'predicted_total': 220.0, 'confidence': 0.0}
+            return self._default_prediction(len(features))
         
         try:
-            X = self.prepare_features(features)
-            X_scaled = self.scaler.transform(X)
-            
-            predicted_total = self.model.predict(X_scaled)[0]
+            X = _features_from_records(features, self.feature_columns)
+            
+            onnx_session = self.onnx_session
+            if gpu_model is not None:
+                with cuml.using_output_type('numpy'):
+                    predicted_total = gpu_model.predict(X).ravel()
+            elif onnx_session is not None:
+                predicted_total = onnx_session.run(None, {'X': X})[0].ravel()
+            else:
+                predicted_total = self.model.predict(X)
             
             # Estimate confidence
-            confidence = min(0.8, 1.0 - abs(predicted_total - 220) / 100.0)  # Higher confidence near average
+            confidence = np.minimum(0.8, 1.0 - np.abs(predicted_total - 220) / 100.0)  # Higher confidence near average
             
             return {
                 'predicted_total': predicted_total,
-                'confidence': max(0.1, confidence)
+                'confidence': np.maximum(0.1, confidence)
             }
             
         except Exception as e:
             logger.error(f"Error predicting total points: {str(e)}")
-            return {'predicted_total': 220.0, 'confidence': 0.0}
+            return self._default_prediction(len(features))
+    
+    def _default_prediction(self, n: int) -> Dict:
+        """League-average totals for n games"""
+        return {'predicted_total': np.full(n, 220.0), 'confidence': np.zeros(n)}
 
 class MLModelManager:
     """Manages all ML models for Project Apex"""
@@ -314,6 +455,25 @@ class MLModelManager:
         self.db = DatabaseManager()
         self.models_dir = "ml_models/saved_models"
         
+        # Single-game requests are queued and scored together in batches
+        self.max_batch_size = 64
+        self.batch_timeout = 0.005
+        self._reset_batcher()
+        
+        # Recent predictions keyed by matchup and a fingerprint of its features
+        self.prediction_cache_size = 4096
+        self._prediction_cache = OrderedDict()
+        self._prediction_cache_lock = threading.Lock()
+        
+        # Threads don't survive fork, and their locks may be held mid-operation;
+        # children get a fresh batcher and cache lock
+        if hasattr(os, 'register_at_fork'):
+            manager_ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: MLModelManager._after_fork(manager_ref))
+        
+        # cuML forests for predict_games_gpu, keyed by model attribute
+        self._gpu_models = {}
+        
         # Create models directory
         os.makedirs(self.models_dir, exist_ok=True)
     
@@ -330,10 +490,17 @@ class MLModelManager:
         
         logger.info(f"Training with {len(training_data)} samples")
         
-        # Train models
-        outcome_success = self.outcome_model.train(training_data)
-        spread_success = self.spread_model.train(training_data)
-        total_success = self.total_model.train(training_data)
+        # Train models concurrently; sklearn's tree builders release the GIL,
+        # and threads let each predictor keep its fitted state in place
+        outcome_success, spread_success, total_success = Parallel(n_jobs=3, backend="threading")(
+            delayed(self._train_with_thread_limit)(model, training_data)
+            for model in (self.outcome_model, self.spread_model, self.total_model)
+        )
+        
+        # Cached predictions and GPU forests came from the previous models
+        self.clear_prediction_cache()
+        if GPU_AVAILABLE:
+            self.load_gpu_models()
         
         # Save models
         if outcome_success:
@@ -343,26 +510,58 @@ class MLModelManager:
         if total_success:
             self.save_model(self.total_model, 'total_points_model')
         
+        if ONNX_AVAILABLE:
+            self.export_onnx()
+        
         success_count = sum([outcome_success, spread_success, total_success])
         logger.info(f"Successfully trained {success_count}/3 models")
         
         return success_count > 0
     
-    def save_model(self, model, model_name: str):
-        """Save a trained model"""
+    def _train_with_thread_limit(self, predictor, training_data: pd.DataFrame) -> bool:
+        """Train one predictor with its OpenMP threads capped at TRAINING_THREADS"""
+        with threadpool_limits(limits=TRAINING_THREADS, user_api='openmp'):
+            return predictor.train(training_data)
+    
+    def save_model(self, predictor, model_name: str, compress=0):
+        """Save a trained predictor's estimator and feature columns
+
+        Files are uncompressed by default so load_model can memory-map them;
+        pass compress=MODEL_COMPRESSION for a smaller file that loads into RAM.
+        """
         try:
             model_path = os.path.join(self.models_dir, f"{model_name}.joblib")
-            joblib.dump(model, model_path)
+            
+            # Only plain data is pickled, not the predictor class itself
+            state = {
+                'model_version': MODEL_FORMAT_VERSION,
+                'model': predictor.model,
+                'feature_columns': tuple(predictor.feature_columns)
+            }
+            
+            # Write beside the old file and swap it in, so processes that
+            # have the old one mapped keep reading intact pages
+            tmp_path = f"{model_path}.tmp"
+            joblib.dump(state, tmp_path, compress=compress)
+            os.replace(tmp_path, model_path)
             logger.info(f"Saved model: {model_name}")
         except Exception as e:
             logger.error(f"Error saving model {model_name}: {str(e)}")
     
-    def load_model(self, model_name: str):
-        """Load a saved model"""
+    def load_model(self, model_name: str) -> Optional[Dict]:
+        """Load a saved model's state dict
+
+        Uncompressed files are memory-mapped read-only, so the model file
+        must not be overwritten in place while a loaded model is in use;
+        save_model replaces it atomically instead.
+        """
         try:
             model_path = os.path.join(self.models_dir, f"{model_name}.joblib")
             if os.path.exists(model_path):
-                return joblib.load(model_path)
+                with warnings.catch_warnings():
+                    # joblib ignores mmap_mode for compressed files; that is expected here
+                    warnings.filterwarnings("ignore", message='mmap_mode .* compressed file')
+                    return self._migrate_model(joblib.load(model_path, mmap_mode='r'))
             else:
                 logger.warning(f"Model file not found: {model_path}")
                 return None
@@ -370,34 +569,149 @@ class MLModelManager:
             logger.error(f"Error loading model {model_name}: {str(e)}")
             return None
     
-    def predict_game(self, home_team_id: str, away_team_id: str) -> Dict:
+    def load_into(self, predictor, model_name: str) -> bool:
+        """Restore a saved model onto a predictor, returning whether one was found"""
+        state = self.load_model(model_name)
+        if state is None or state['model'] is None:
+            return False
+        
+        predictor.model = state['model']
+        predictor.feature_columns = state['feature_columns']
+        predictor.onnx_session = self._load_onnx_session(model_name)
+        predictor.is_trained = True
+        return True
+    
+    def _migrate_model(self, saved) -> Dict:
+        """Convert whatever an older version saved into a MODEL_FORMAT_VERSION state dict"""
+        if isinstance(saved, dict):
+            return saved
+        
+        # Versions 1 and 2 pickled the predictor wrapper itself
+        model = saved.model
+        if getattr(saved, 'model_version', 1) < 2:
+            # Version 1 models were fitted on scaled features; fold the
+            # scaler into a pipeline so they still see what they expect
+            scaler = saved.__dict__.get('scaler')
+            if scaler is not None and model is not None:
+                model = make_pipeline(scaler, model)
+        
+        return {
+            'model_version': MODEL_FORMAT_VERSION,
+            'model': model if saved.is_trained else None,
+            'feature_columns': tuple(saved.feature_columns or ())
+        }
+    
+    def _named_models(self):
+        """(attribute, saved model name) for each managed model"""
+        return (
+            ('outcome_model', 'game_outcome_model'),
+            ('spread_model', 'spread_model'),
+            ('total_model', 'total_points_model')
+        )
+    
+    def load_models(self) -> int:
+        """Load all saved models into the manager, returning how many were found"""
+        loaded = 0
+        for attr, model_name in self._named_models():
+            if self.load_into(getattr(self, attr), model_name):
+                loaded += 1
+        
+        self.clear_prediction_cache()
+        logger.info(f"Loaded {loaded}/3 saved models")
+        
+        if GPU_AVAILABLE:
+            self.load_gpu_models()
+        
+        return loaded
+    
+    def load_gpu_models(self) -> int:
+        """Map each trained model onto a cuML GPU forest for predict_games_gpu"""
+        self._gpu_models = {}
+        if not GPU_AVAILABLE:
+            logger.warning("cuML not available or APEX_USE_GPU not set, GPU inference disabled")
+            return 0
+        
+        for attr, model_name in self._named_models():
+            predictor = getattr(self, attr)
+            if not predictor.is_trained:
+                continue
+            
+            try:
+                self._gpu_models[attr] = ForestInference.load_from_sklearn(
+                    predictor.model, output_class=hasattr(predictor.model, 'predict_proba')
+                )
+            except Exception as e:
+                logger.error(f"Error loading model {model_name} onto the GPU: {str(e)}")
+        
+        return len(self._gpu_models)
+    
+    def export_onnx(self) -> int:
+        """Export each trained model to ONNX beside its joblib file"""
+        if not ONNX_AVAILABLE:
+            logger.warning("skl2onnx/onnxruntime not installed, skipping ONNX export")
+            return 0
+        
+        exported = 0
+        for attr, model_name in self._named_models():
+            predictor = getattr(self, attr)
+            if not predictor.is_trained:
+                continue
+            
+            try:
+                # Migrated models are scaler+model pipelines
+                model = predictor.model
+                estimator = model[-1] if isinstance(model, Pipeline) else model
+                
+                initial_types = [('X', FloatTensorType([None, len(predictor.feature_columns)]))]
+                # Plain probability arrays instead of per-row dicts
+                options = {id(estimator): {'zipmap': False}} if hasattr(estimator, 'predict_proba') else None
+                
+                onx = convert_sklearn(model, initial_types=initial_types, options=options)
+                with open(os.path.join(self.models_dir, f"{model_name}.onnx"), 'wb') as f:
+                    f.write(onx.SerializeToString())
+                
+                predictor.onnx_session = self._load_onnx_session(model_name)
+                exported += 1
+            except Exception as e:
+                logger.error(f"Error exporting model {model_name} to ONNX: {str(e)}")
+        
+        return exported
+    
+    def _load_onnx_session(self, model_name: str):
+        """Open an inference session for a model's ONNX export, if it is current"""
+        if not ONNX_AVAILABLE:
+            return None
+        
+        onnx_path = os.path.join(self.models_dir, f"{model_name}.onnx")
+        model_path = os.path.join(self.models_dir, f"{model_name}.joblib")
+        
+        # An export older than the saved model belongs to a previous fit
+        if not os.path.exists(onnx_path) or (
+            os.path.exists(model_path) and os.path.getmtime(onnx_path) < os.path.getmtime(model_path)
+        ):
+            return None
+        
+        try:
+            return onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+        except Exception as e:
+            logger.error(f"Error loading ONNX model {model_name}: {str(e)}")
+            return None
+    
+    def predict_game(self, home_team_id: str, away_team_id: str, bypass_cache: bool = False) -> Dict:
         """Generate comprehensive predictions for a game"""
         try:
-            # Create features
+            # Features are built on the caller's thread; only model inference is batched
             features_dict = self.feature_engineer.create_game_features(home_team_id, away_team_id)
-            features_df = pd.DataFrame([features_dict])
-            
-            # Get predictions from all models
-            outcome_pred = self.outcome_model.predict(features_df)
-            spread_pred = self.spread_model.predict(features_df)
-            total_pred = self.total_model.predict(features_df)
-            
-            # Combine predictions
-            predictions = {
-                'home_win_probability': outcome_pred['home_win_probability'],
-                'away_win_probability': outcome_pred['away_win_probability'],
-                'predicted_spread': spread_pred['predicted_spread'],
-                'predicted_total': total_pred['predicted_total'],
-                'confidence_scores': {
-                    'outcome': outcome_pred['confidence'],
-                    'spread': spread_pred['confidence'],
-                    'total': total_pred['confidence']
-                },
-                'model_name': 'Project Apex ML',
-                'prediction_time': datetime.now().isoformat()
-            }
+            cache_key = self._prediction_cache_key(home_team_id, away_team_id, features_dict)
+            
+            if not bypass_cache:
+                cached = self._get_cached_prediction(cache_key)
+                if cached is not None:
+                    return cached
             
-            return predictions
+            prediction = self._submit_features(features_dict).result(timeout=PREDICTION_TIMEOUT)
+            self._cache_prediction(cache_key, prediction)
+            return prediction
             
         except Exception as e:
             logger.error(f"Error generating game predictions: {str(e)}")
@@ -408,6 +722,155 @@ class MLModelManager:
                 'predicted_total': 220.0,
                 'confidence_scores': {'outcome': 0.0, 'spread': 0.0, 'total': 0.0}
             }
+    
+    def predict_games(self, pairs: List[Tuple[str, str]], bypass_cache: bool = False) -> List[Dict]:
+        """Generate predictions for many (home_team_id, away_team_id) pairs at once"""
+        records = [
+            self.feature_engineer.create_game_features(home_team_id, away_team_id)
+            for home_team_id, away_team_id in pairs
+        ]
+        cache_keys = [
+            self._prediction_cache_key(home_team_id, away_team_id, features_dict)
+            for (home_team_id, away_team_id), features_dict in zip(pairs, records)
+        ]
+        
+        predictions = [None] * len(records)
+        if not bypass_cache:
+            predictions = [self._get_cached_prediction(key) for key in cache_keys]
+        
+        # Score only the games without a cached prediction
+        misses = [i for i, prediction in enumerate(predictions) if prediction is None]
+        scored = self._predict_feature_records([records[i] for i in misses])
+        for i, prediction in zip(misses, scored):
+            predictions[i] = prediction
+            self._cache_prediction(cache_keys[i], prediction)
+        
+        return predictions
+    
+    def _prediction_cache_key(self, home_team_id: str, away_team_id: str, features_dict: Dict) -> Tuple:
+        """Key a matchup by its teams, the current hour and a short hash of its features"""
+        fingerprint = hashlib.blake2s(repr(sorted(features_dict.items())).encode(), digest_size=8).digest()
+        return (home_team_id, away_team_id, stats_bucket(), fingerprint)
+    
+    def _get_cached_prediction(self, cache_key: Tuple):
+        """Return a copy of a cached prediction, or None"""
+        with self._prediction_cache_lock:
+            prediction = self._prediction_cache.get(cache_key)
+            if prediction is None:
+                return None
+            self._prediction_cache.move_to_end(cache_key)
+        return dict(prediction, confidence_scores=dict(prediction['confidence_scores']))
+    
+    def _cache_prediction(self, cache_key: Tuple, prediction: Dict):
+        """Remember a prediction, evicting the least recently used beyond the cache size"""
+        with self._prediction_cache_lock:
+            self._prediction_cache[cache_key] = prediction
+            self._prediction_cache.move_to_end(cache_key)
+            while len(self._prediction_cache) > self.prediction_cache_size:
+                self._prediction_cache.popitem(last=False)
+    
+    def clear_prediction_cache(self):
+        """Drop all cached predictions"""
+        with self._prediction_cache_lock:
+            self._prediction_cache.clear()
+    
+    def clear_feature_cache(self):
+        """Forget memoized team and head-to-head stats, e.g. after new results are loaded
+
+        Memoized stats and cached predictions otherwise expire at the top of
+        each UTC hour. Cached predictions are keyed by their features, so
+        within the hour they are only reused if the refreshed stats come
+        out the same.
+        """
+        self.feature_engineer.invalidate()
+    
+    def predict_games_gpu(self, records: List[Dict]) -> List[Dict]:
+        """Score a large batch of feature dicts on the GPU, for offline backfills
+
+        Models without a GPU forest are scored on the CPU as usual.
+        """
+        return self._predict_feature_records(records, gpu_models=self._gpu_models)
+    
+    def _predict_feature_records(self, records: List[Dict], gpu_models: Dict = None) -> List[Dict]:
+        """Run each model once over the stacked feature rows"""
+        if not records:
+            return []
+        
+        gpu_models = gpu_models or {}
+        
+        # Get predictions from all models
+        outcome_pred = self.outcome_model.predict(records, gpu_model=gpu_models.get('outcome_model'))
+        spread_pred = self.spread_model.predict(records, gpu_model=gpu_models.get('spread_model'))
+        total_pred = self.total_model.predict(records, gpu_model=gpu_models.get('total_model'))
+        
+        prediction_time = datetime.now().isoformat()
+        
+        # Combine predictions
+        return [
+            {
+                'home_win_probability': float(outcome_pred['home_win_probability'][i]),
+                'away_win_probability': float(outcome_pred['away_win_probability'][i]),
+                'predicted_spread': float(spread_pred['predicted_spread'][i]),
+                'predicted_total': float(total_pred['predicted_total'][i]),
+                'confidence_scores': {
+                    'outcome': float(outcome_pred['confidence'][i]),
+                    'spread': float(spread_pred['confidence'][i]),
+                    'total': float(total_pred['confidence'][i])
+                },
+                'model_name': 'Project Apex ML',
+                'prediction_time': prediction_time
+            }
+            for i in range(len(records))
+        ]
+    
+    def _reset_batcher(self):
+        """Start over with an empty request queue and no batch worker"""
+        self._request_queue = queue.Queue()
+        self._batch_worker = None
+        self._batch_worker_lock = threading.Lock()
+    
+    @staticmethod
+    def _after_fork(manager_ref):
+        """Reset a manager's thread state in a forked child"""
+        manager = manager_ref()
+        if manager is not None:
+            manager._reset_batcher()
+            manager._prediction_cache_lock = threading.Lock()
+    
+    def _submit_features(self, features_dict: Dict) -> Future:
+        """Queue one game's features for the next inference batch"""
+        with self._batch_worker_lock:
+            if self._batch_worker is None or not self._batch_worker.is_alive():
+                self._batch_worker = threading.Thread(target=self._batch_loop, name="prediction-batcher", daemon=True)
+                self._batch_worker.start()
+        
+        future = Future()
+        self._request_queue.put((features_dict, future))
+        return future
+    
+    def _batch_loop(self):
+        """Drain queued requests into batches of up to max_batch_size"""
+        while True:
+            batch = [self._request_queue.get()]
+            deadline = time.monotonic() + self.batch_timeout
+            
+            # Wait briefly for more requests before scoring what we have
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._request_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                results = self._predict_feature_records([features for features, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
 
 if __name__ == "__main__":
     # Initialize and train models
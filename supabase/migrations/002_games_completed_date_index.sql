@@ -0,0 +1,6 @@
+
+-- Completed games are only ever read by game_date (team stats, head-to-head,
+-- training history), so index just that subset
+CREATE INDEX IF NOT EXISTS games_completed_date_idx
+  ON games (game_date)
+  WHERE status = 'completed';
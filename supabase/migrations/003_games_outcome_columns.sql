@@ -0,0 +1,10 @@
+
+-- Precomputed game outcomes, kept in sync by Postgres whenever scores change.
+-- Prediction accuracy updates read these instead of recomputing them.
+ALTER TABLE games
+  ADD COLUMN IF NOT EXISTS home_won boolean
+    GENERATED ALWAYS AS (home_score > away_score) STORED,
+  ADD COLUMN IF NOT EXISTS point_margin integer
+    GENERATED ALWAYS AS (home_score - away_score) STORED,
+  ADD COLUMN IF NOT EXISTS point_total integer
+    GENERATED ALWAYS AS (home_score + away_score) STORED;